@@ -18,6 +18,9 @@ class DatabaseConfig:
     password: Optional[str] = os.getenv('MYSQL_PASSWORD')
     database: Optional[str] = os.getenv('MYSQL_DATABASE')
     charset: str = 'utf8mb4'
+    pool_size: int = int(os.getenv('MYSQL_POOL_SIZE', '5'))
+    # Seconds to cache user thread IDs in-process; 0 disables (only safe with a single worker)
+    thread_id_cache_ttl: int = int(os.getenv('MYSQL_THREAD_ID_CACHE_TTL', '0'))
     
     def __post_init__(self):
         if not self.database:
@@ -57,6 +60,8 @@ class OpenAIConfig:
     temperature: float = float(os.getenv('OPENAI_TEMPERATURE', '0.7'))
     prompt_id: Optional[str] = os.getenv('OPENAI_PROMPT_ID')
     prompt_version: Optional[str] = os.getenv('OPENAI_PROMPT_VERSION') or None  # None = auto-latest
+    # Reuse replies to identical first-turn questions (skips the API call on a hit)
+    enable_response_cache: bool = os.getenv('OPENAI_ENABLE_RESPONSE_CACHE', 'False').lower() == 'true'
 
     # Organization extraction responsive prompt configuration
     org_extract_prompt_id: Optional[str] = os.getenv('OPENAI_ORG_EXTRACT_PROMPT_ID')
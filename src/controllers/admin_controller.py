@@ -133,13 +133,6 @@ class AdminController:
                 active_count = sum(1 for u in users if not u['is_blocked'])
                 blocked_count = sum(1 for u in users if u['is_blocked'])
 
-                # Convert datetime objects to strings for JSON serialization
-                for user in users:
-                    if user.get('last_activity'):
-                        user['last_activity'] = user['last_activity'].strftime('%Y-%m-%d %H:%M:%S')
-                    if user.get('blocked_until'):
-                        user['blocked_until'] = user['blocked_until'].strftime('%Y-%m-%d %H:%M:%S')
-
                 return jsonify({
                     'success': True,
                     'users': users,
@@ -4,9 +4,9 @@ Handles short, incomplete sentences by buffering them and sending to AI after id
 """
 import time
 import threading
-from collections import defaultdict, deque
+from collections import deque
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Callable, Deque
+from typing import Dict, List, Optional, Callable, Deque, Tuple
 
 from config import config
 from src.utils import setup_logger, count_chinese_characters
@@ -15,6 +15,9 @@ from src.models import Message
 
 logger = setup_logger(__name__)
 
+# Number of lock stripes guarding user buffers (must be a power of two)
+LOCK_STRIPES = 16
+
 
 @dataclass
 class BufferedMessage:
@@ -55,10 +58,12 @@ class MessageBufferManager:
     def __init__(self):
         self.config = config.message_buffer
         self.user_buffers: Dict[str, UserBuffer] = {}
-        self.locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        # Fixed pool of striped locks instead of one lock per user ever seen.
+        # Never held while a buffer is processed, so other users on a stripe don't wait on the AI.
+        self.locks: List[threading.Lock] = [threading.Lock() for _ in range(LOCK_STRIPES)]
         self.process_callback: Optional[Callable] = None
         
-        logger.info(f"Message buffer initialized - timeout: {self.config.timeout}s, max_size: {self.config.max_size}")
+        logger.info("Message buffer initialized - timeout: %ss, max_size: %s", self.config.timeout, self.config.max_size)
     
     def set_process_callback(self, callback: Callable[[str, str, str], None]):
         """
@@ -70,6 +75,10 @@ class MessageBufferManager:
         self.process_callback = callback
     
     
+    def _lock_for(self, user_id: str) -> threading.Lock:
+        """Get the lock stripe guarding a user's buffer."""
+        return self.locks[hash(user_id) & (LOCK_STRIPES - 1)]
+
     def _cancel_timer(self, user_buffer: UserBuffer):
         """Cancel timer for user buffer."""
         if user_buffer.timer:
@@ -81,11 +90,13 @@ class MessageBufferManager:
         user_buffer.messages.clear()
         self._cancel_timer(user_buffer)
     
-    def _ensure_user_buffer_exists(self, user_id: str):
-        """Ensure user buffer exists."""
-        if user_id not in self.user_buffers:
-            self.user_buffers[user_id] = UserBuffer(user_id)
-            logger.debug(f"Created new buffer for user {user_id}")
+    def _ensure_user_buffer_exists(self, user_id: str) -> UserBuffer:
+        """Ensure user buffer exists and return it."""
+        user_buffer = self.user_buffers.get(user_id)
+        if user_buffer is None:
+            user_buffer = self.user_buffers[user_id] = UserBuffer(user_id)
+            logger.debug("Created new buffer for user %s", user_id)
+        return user_buffer
     
     def _update_last_activity(self, user_id: str):
         """Update last activity timestamp for user."""
@@ -118,16 +129,16 @@ class MessageBufferManager:
         user_id = message.user_id
         content = message.content
         
-        # Ensure user buffer exists
-        self._ensure_user_buffer_exists(user_id)
+        # Read-only probe - the buffer is only created once the message is accepted
+        user_buffer = self.user_buffers.get(user_id)
         
         # Check if adding this message would exceed Chinese character limit
-        user_buffer = self.user_buffers[user_id]
-        if self._would_exceed_char_limit(user_buffer, content):
-            logger.info(f"Message would exceed {self.config.max_chinese_chars} Chinese character limit for user {user_id}, processing current buffer first")
+        if user_buffer and self._would_exceed_char_limit(user_buffer, content):
+            logger.info("Message would exceed %s Chinese character limit for user %s, processing current buffer first",
+                        self.config.max_chinese_chars, user_id)
             return False  # Process current buffer first, then this message will start new buffer
         
-        logger.info(f"Message will be buffered for user {user_id}: '{content[:50]}...' (length: {len(content)})")
+        logger.info("Message will be buffered for user %s: '%.50s...' (length: %d)", user_id, content, len(content))
         return True
     
     def add_message(self, message: Message) -> bool:
@@ -141,14 +152,15 @@ class MessageBufferManager:
             True if message was buffered, False if processed immediately
         """
         user_id = message.user_id
+        snapshot = None
         
-        with self.locks[user_id]:
+        with self._lock_for(user_id):
             # Check if message should be buffered
             if not self.should_buffer_message(message):
-                logger.debug(f"Message not buffered for user {user_id}")
+                logger.debug("Message not buffered for user %s", user_id)
                 return False
             
-            user_buffer = self.user_buffers[user_id]  # Buffer exists from should_buffer_message
+            user_buffer = self._ensure_user_buffer_exists(user_id)
             
             # Add message to buffer and update activity
             current_time = self._update_last_activity(user_id)
@@ -162,11 +174,8 @@ class MessageBufferManager:
             
             # Check if buffer is full by message count
             if len(user_buffer.messages) >= self.config.max_size:
-                # Cancel existing timer since we're processing immediately
-                self._cancel_timer(user_buffer)
-                
-                logger.info(f"Buffer full (message count) for user {user_id}, processing immediately")
-                self._process_buffer(user_id)
+                logger.info("Buffer full (message count) for user %s, processing immediately", user_id)
+                snapshot = self._take_buffer(user_id)
             else:
                 # Only set timer if one doesn't exist yet
                 if user_buffer.timer is None:
@@ -176,11 +185,14 @@ class MessageBufferManager:
                         args=[user_id]
                     )
                     user_buffer.timer.start()
-                    logger.debug(f"Started buffer timer for user {user_id}")
+                    logger.debug("Started buffer timer for user %s", user_id)
                 
-                logger.debug(f"Message buffered for user {user_id} ({len(user_buffer.messages)}/{self.config.max_size})")
-            
-            return True
+                logger.debug("Message buffered for user %s (%d/%s)", user_id, len(user_buffer.messages), self.config.max_size)
+        
+        # Process messages OUTSIDE the lock - don't block other users on this stripe
+        if snapshot:
+            self._process_messages_in_background(user_id, *snapshot)
+        return True
     
     def force_process_user_buffer(self, user_id: str) -> bool:
         """
@@ -192,45 +204,53 @@ class MessageBufferManager:
         Returns:
             True if buffer was processed, False if no buffer exists
         """
-        with self.locks[user_id]:
-            if user_id in self.user_buffers and self.user_buffers[user_id].messages:
-                self._process_buffer(user_id)
-                return True
+        with self._lock_for(user_id):
+            snapshot = self._take_buffer(user_id)
+        
+        if not snapshot:
             return False
+        
+        # Process messages OUTSIDE the lock - don't block other users on this stripe
+        self._process_messages_in_background(user_id, *snapshot)
+        return True
+    
+    def _take_buffer(self, user_id: str) -> Optional[Tuple[List[BufferedMessage], str]]:
+        """
+        Atomically snapshot and delete a user's buffer. Caller must hold the user's lock stripe.
+        
+        Args:
+            user_id: User ID to take buffer for
+            
+        Returns:
+            (messages, reply token of the last message), or None if nothing is buffered
+        """
+        user_buffer = self.user_buffers.get(user_id)
+        if user_buffer is None or not user_buffer.messages:
+            return None
+        
+        # ATOMIC: Take snapshot of messages and delete entire user buffer
+        messages_to_process = list(user_buffer.messages)
+        self._cancel_timer(user_buffer)
+        
+        # Delete entire user buffer (not just clear) - fresh start for next messages
+        del self.user_buffers[user_id]
+        
+        # Get reply token from last message
+        return messages_to_process, messages_to_process[-1].message.reply_token
     
     def _process_buffer(self, user_id: str):
         """
-        Process buffered messages for a user using atomic snapshot-and-clear.
+        Process buffered messages for a user when the buffer timer fires.
         
         Args:
             user_id: User ID to process buffer for
         """
-        # Atomic snapshot and delete - do this under lock
-        messages_to_process = None
-        reply_token = None
-        
-        with self.locks[user_id]:
-            if user_id not in self.user_buffers:
-                return
-            
-            user_buffer = self.user_buffers[user_id]
-            
-            if not user_buffer.messages:
-                return
-            
-            # ATOMIC: Take snapshot of messages and delete entire user buffer
-            messages_to_process = list(user_buffer.messages)
-            self._cancel_timer(user_buffer)
-            
-            # Delete entire user buffer (not just clear) - fresh start for next messages
-            del self.user_buffers[user_id]
-            
-            # Get reply token from last message
-            reply_token = messages_to_process[-1].message.reply_token if messages_to_process else None
+        with self._lock_for(user_id):
+            snapshot = self._take_buffer(user_id)
         
         # Process messages OUTSIDE the lock - don't block new message collection
-        if messages_to_process:
-            self._process_messages_in_background(user_id, messages_to_process, reply_token)
+        if snapshot:
+            self._process_messages_in_background(user_id, *snapshot)
     
     def _process_messages_in_background(self, user_id: str, messages: List[BufferedMessage], reply_token: str):
         """
@@ -241,7 +261,7 @@ class MessageBufferManager:
             messages: Messages to process
             reply_token: Reply token for response
         """
-        logger.info(f"Processing buffer for user {user_id} with {len(messages)} messages")
+        logger.info("Processing buffer for user %s with %d messages", user_id, len(messages))
         
         try:
             # Combine messages into single context
@@ -251,10 +271,10 @@ class MessageBufferManager:
             if self.process_callback and combined_content:
                 self.process_callback(user_id, combined_content, reply_token)
             
-            logger.info(f"Successfully processed buffer for user {user_id}")
+            logger.info("Successfully processed buffer for user %s", user_id)
             
         except Exception as e:
-            logger.error(f"Error processing buffer for user {user_id}: {e}")
+            logger.error("Error processing buffer for user %s: %s", user_id, e)
             
             # Try to process individual messages as fallback
             if self.process_callback:
@@ -266,7 +286,7 @@ class MessageBufferManager:
                             buffered_msg.message.reply_token
                         )
                     except Exception as fallback_error:
-                        logger.error(f"Fallback processing failed: {fallback_error}")
+                        logger.error("Fallback processing failed: %s", fallback_error)
     
     
     def _combine_messages(self, messages: List[BufferedMessage]) -> str:
@@ -292,7 +312,7 @@ class MessageBufferManager:
         # Join with spaces to create one natural sentence
         result = " ".join(combined_parts)
         
-        logger.debug(f"Combined {len(combined_parts)} messages into: {result[:100]}...")
+        logger.debug("Combined %d messages into: %.100s...", len(combined_parts), result)
         
         return result
     
@@ -307,7 +327,7 @@ class MessageBufferManager:
         Returns:
             Dictionary with buffer status
         """
-        with self.locks[user_id]:
+        with self._lock_for(user_id):
             if user_id not in self.user_buffers:
                 return {
                     'exists': False,
@@ -332,10 +352,10 @@ class MessageBufferManager:
         Args:
             user_id: User ID
         """
-        with self.locks[user_id]:
+        with self._lock_for(user_id):
             if user_id in self.user_buffers:
                 self._clear_user_buffer_internal(self.user_buffers[user_id])
-                logger.info(f"Cleared buffer for user {user_id}")
+                logger.info("Cleared buffer for user %s", user_id)
     
     def get_stats(self) -> dict:
         """Get overall buffer statistics."""
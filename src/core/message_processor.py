@@ -3,11 +3,13 @@ Central message processor that coordinates all message handling.
 """
 import time
 import threading
+import traceback
 from typing import Optional
 import openai
+from cachetools import TTLCache
 
 from config import config
-from src.utils import setup_logger, log_user_action, MessageProcessingError
+from src.utils import setup_logger, log_user_action, log_error_with_context, MessageProcessingError
 from src.models import Message, AIResponse
 from src.services import DatabaseService, AgentsAPIService, LineService
 from src.services.user_handover_service import UserHandoverService
@@ -17,6 +19,11 @@ from src.messages import messages
 
 logger = setup_logger(__name__)
 
+# Users known to have an organization name; lets process_message skip the
+# organization lookup for registered users. The TTL bounds staleness from manual DB edits.
+ORG_REGISTERED_CACHE_TTL = 300
+ORG_REGISTERED_CACHE_MAXSIZE = 10_000
+
 
 class MessageProcessor:
     """Central processor for handling incoming messages."""
@@ -31,6 +38,16 @@ class MessageProcessor:
         self.line = line_service
         self.handover_service = user_handover_service
         
+        self._org_registered = TTLCache(maxsize=ORG_REGISTERED_CACHE_MAXSIZE, ttl=ORG_REGISTERED_CACHE_TTL)
+        self._org_registered_lock = threading.Lock()  # TTLCache is not thread-safe
+        
+        # Chain of responsibility - each handler returns True if it handled the message
+        self._handlers = (
+            self._handle_non_text_messages,
+            self._handle_handover_requests,
+            self._handle_ai_response
+        )
+        
         # Use Agents API service exclusively
         self.ai = agents_api_service
         logger.info("Using Agents API service")
@@ -66,9 +83,17 @@ class MessageProcessor:
             ).start()
             return
 
-        # 1. Get organization record, ensuring it exists (atomic operation)
-        org_record = self.db.get_organization_record(user_id, ensure_exists=True)
-        if org_record and org_record.get('organization_name'):
+        # 1. Get organization record, ensuring it exists (atomic operation),
+        #    unless the user is already known to be registered
+        with self._org_registered_lock:
+            has_org_name = user_id in self._org_registered
+        if not has_org_name:
+            org_record = self.db.get_organization_record(user_id, ensure_exists=True)
+            has_org_name = bool(org_record and org_record.get('organization_name'))
+            if has_org_name:
+                self._mark_org_registered(user_id)
+
+        if has_org_name:
             # Has org_name → skip the rest, get into message buffer (EXISTING LOGIC)
             if message.message_type == "text":
                 if message_buffer.add_message(message):
@@ -110,6 +135,7 @@ class MessageProcessor:
         if extracted_org.lower() != "none":
             # Found org_name → save it and reply with success message
             self.db.update_organization_record(user_id, organization_name=extracted_org)
+            self._mark_org_registered(user_id)
             # Keep reminded_count as is (don't reset to 0)
 
             # Notify admin about successful organization registration
@@ -152,6 +178,11 @@ class MessageProcessor:
             return
     
     
+    def _mark_org_registered(self, user_id: str) -> None:
+        """Remember that a user has an organization name on record."""
+        with self._org_registered_lock:
+            self._org_registered[user_id] = True
+
     def _handle_single_message(self, message: Message) -> None:
         """
         Handle a single message using chain of responsibility pattern.
@@ -181,26 +212,20 @@ class MessageProcessor:
                 message_type=message.message_type,
                 content_length=len(message.content)
             )
-            
-            # Ensure user record exists in organization_data table
-            self._ensure_user_record(message.user_id)
+
+            # No ensure_user_record here: process_message already created the organization_data row
 
             # Chain of responsibility - each handler returns True if it handled the message
-            handlers = [
-                self._handle_non_text_messages,
-                self._handle_handover_requests,
-                self._handle_ai_response
-            ]
-            
-            for i, handler in enumerate(handlers):
+            handler_count = len(self._handlers)
+            for i, handler in enumerate(self._handlers, 1):
                 try:
                     handler_name = handler.__name__
-                    logger.debug(f"Running handler {i+1}/5: {handler_name} for user {message.user_id}")
+                    logger.debug("Running handler %d/%d: %s for user %s", i, handler_count, handler_name, message.user_id)
                     if handler(message):
                         logger.info(f"Message handled by {handler_name} for user {message.user_id}")
                         break
                     else:
-                        logger.debug(f"Handler {handler_name} passed on message for user {message.user_id}")
+                        logger.debug("Handler %s passed on message for user %s", handler_name, message.user_id)
                 except Exception as handler_error:
                     logger.error(f"Handler {handler.__name__} failed for user {message.user_id}: {handler_error}")
                     # Continue to next handler instead of breaking the chain
@@ -279,13 +304,6 @@ class MessageProcessor:
         return False
     
     
-    def _ensure_user_record(self, user_id: str) -> None:
-        """Ensure user record exists in organization_data table."""
-        try:
-            self.db.ensure_user_record(user_id)
-        except Exception as e:
-            logger.error(f"Failed to ensure user record for {user_id}: {e}")
-    
     def _handle_handover_requests(self, message: Message) -> bool:
         """Handle requests for human handover."""
         if not self.line.is_handover_request(message.content):
@@ -371,10 +389,11 @@ class MessageProcessor:
             
             # Push debug info separately if enabled
             if config.show_ai_debug_info:
-                debug_info = "🔧 AI詳細資訊：\n"
+                debug_parts = ["🔧 AI詳細資訊："]
                 if ai_response.explanation:
-                    debug_info += f"AI說明：\n{ai_response.explanation}\n"
-                debug_info += f"信心度：{ai_response.confidence:.2f}"
+                    debug_parts.append(f"AI說明：\n{ai_response.explanation}")
+                debug_parts.append(f"信心度：{ai_response.confidence:.2f}")
+                debug_info = "\n".join(debug_parts)
                 
                 # Push debug info as separate message
                 time.sleep(0.5)  # Small delay to ensure proper message order
@@ -392,7 +411,6 @@ class MessageProcessor:
             
         except Exception as e:
             logger.error(f"Failed to get AI response for user {message.user_id}: {e}")
-            import traceback
             logger.error(f"AI response error traceback: {traceback.format_exc()}")
 
             # Set handover flag (blocks future AI responses)
@@ -447,7 +465,7 @@ class MessageProcessor:
                 response = client.chat.completions.create(
                     model="gpt-3.5-turbo",
                     messages=[
-                        {"role": "system", "content": messages.get_org_extraction_prompt()},
+                        messages.get_org_extraction_system_message(),
                         {"role": "user", "content": user_message}
                     ],
                     max_tokens=100,
@@ -477,7 +495,6 @@ class MessageProcessor:
         self._send_error_response(message.user_id, message.reply_token)
 
         # Log the error with context
-        from src.utils import log_error_with_context
         log_error_with_context(
             logger,
             error,
@@ -73,6 +73,12 @@ class MessageManager:
         self.language = language
         self.messages = Messages()
 
+        # Chat message for the org-name extractor; constant per language, so built once
+        self._org_extraction_system_message = {
+            "role": "system",
+            "content": self.messages.ORG_EXTRACTION_SYSTEM_PROMPT
+        }
+
         # Future: Support for multiple languages
         # if language == "en":
         #     self.messages = EnglishMessages()
@@ -95,14 +101,15 @@ class MessageManager:
                                  user_msg: str, keyword: str,
                                  confidence: float = None) -> str:
         """Format admin notification message."""
-        notification_text = f"{self.messages.ADMIN_NOTIFICATION_CONTACT}: {org_name}({user_nickname})\n"
-        notification_text += f"{self.messages.ADMIN_NOTIFICATION_USER_MESSAGE}: {user_msg}\n"
-        notification_text += f"{self.messages.ADMIN_NOTIFICATION_KEYWORD}: {keyword}\n"
-
-        if confidence is not None:
-            notification_text += f"{self.messages.ADMIN_NOTIFICATION_CONFIDENCE}: {confidence:.2f}"
-
-        return notification_text
+        m = self.messages
+        parts = [
+            f"{m.ADMIN_NOTIFICATION_CONTACT}: {org_name}({user_nickname})",
+            f"{m.ADMIN_NOTIFICATION_USER_MESSAGE}: {user_msg}",
+            f"{m.ADMIN_NOTIFICATION_KEYWORD}: {keyword}",
+            # Keeps the trailing newline after the keyword line when no confidence is given
+            f"{m.ADMIN_NOTIFICATION_CONFIDENCE}: {confidence:.2f}" if confidence is not None else "",
+        ]
+        return "\n".join(parts)
 
     def is_handover_request(self, message_text: str) -> bool:
         """Check if message is a handover request."""
@@ -161,6 +168,10 @@ class MessageManager:
         """Get organization name extraction system prompt."""
         return self.messages.ORG_EXTRACTION_SYSTEM_PROMPT
 
+    def get_org_extraction_system_message(self) -> dict:
+        """Get organization name extraction prompt as a prebuilt system chat message."""
+        return self._org_extraction_system_message
+
 
 # Global message manager instance
 messages = MessageManager()
\ No newline at end of file
@@ -1,50 +1,51 @@
 """
 User data models and entities.
 """
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 from datetime import datetime, timezone
 
+from config import config
 
-@dataclass
+
+# Read once at import; the threshold is fixed for the lifetime of the process
+_CONFIDENCE_THRESHOLD = config.openai.confidence_threshold
+
+
+def _now() -> datetime:
+    """Current UTC time, used as the default for timestamp fields."""
+    return datetime.now(timezone.utc)
+
+
+@dataclass(slots=True)
 class User:
     """User entity model."""
     user_id: str
     thread_id: Optional[str] = None
-    created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
+    created_at: datetime = field(default_factory=_now)
+    updated_at: datetime = field(default_factory=_now)
     is_active: bool = True
-    
-    def __post_init__(self):
-        if self.created_at is None:
-            self.created_at = datetime.now(timezone.utc)
-        if self.updated_at is None:
-            self.updated_at = datetime.now(timezone.utc)
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     """Message entity model."""
     content: str
     user_id: str
     message_type: str = "text"
-    timestamp: Optional[datetime] = None
+    timestamp: datetime = field(default_factory=_now)
     reply_token: Optional[str] = None
 
-    def __post_init__(self):
-        if self.timestamp is None:
-            self.timestamp = datetime.now(timezone.utc)
-
 
-@dataclass
+@dataclass(slots=True)
 class AIResponse:
     """AI response model with confidence scoring."""
     text: str
     confidence: float
     user_id: str
     explanation: Optional[str] = None
-    timestamp: Optional[datetime] = None
-    metadata: Optional[dict] = None
+    timestamp: datetime = field(default_factory=_now)
+    metadata: dict = field(default_factory=dict)
 
     # Extended schema fields (optional for backward compatibility)
     intent: Optional[str] = None
@@ -57,14 +58,27 @@ class AIResponse:
     policy_escalation: Optional[str] = None
     notes: Optional[str] = None
 
-    def __post_init__(self):
-        if self.timestamp is None:
-            self.timestamp = datetime.now(timezone.utc)
-        if self.metadata is None:
-            self.metadata = {}
-            
+    @classmethod
+    def from_dict(cls, data: dict, user_id: str) -> "AIResponse":
+        """Build from the agent's JSON reply; required fields are validated by the caller."""
+        policy = data.get("policy") or {}
+        return cls(
+            text=data["text"],
+            confidence=float(data["confidence"]),
+            explanation=data["explanation"],
+            user_id=user_id,
+            intent=data.get("intent"),
+            queries=data.get("queries", []),
+            sources=data.get("sources", []),
+            gaps=data.get("gaps", []),
+            policy_scope=policy.get("scope"),
+            policy_risk=policy.get("risk"),
+            policy_pii=policy.get("pii"),
+            policy_escalation=policy.get("escalation"),
+            notes=data.get("notes")
+        )
+
     @property
     def needs_human_review(self) -> bool:
         """Check if response needs human review based on confidence."""
-        from config import config
-        return self.confidence < config.openai.confidence_threshold
\ No newline at end of file
+        return self.confidence < _CONFIDENCE_THRESHOLD
\ No newline at end of file
@@ -1,24 +1,47 @@
 # src/services/agents_api_service.py
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 
-from openai import OpenAI
+import httpx
+import jiter
+from cachetools import TTLCache
+from openai import DefaultHttpxClient, OpenAI
 
 from config import config
 from src.utils import setup_logger
 from src.models import AIResponse
 from src.services.database_service import DatabaseService
+from src.services.tool_functions import ToolFunctions
 
 logger = setup_logger(__name__)
 
+# Shared decoder for pulling the first JSON object out of a wrapped reply
+_JSON_DECODER = json.JSONDecoder()
+
+# Separator line used in the tool debug pushes
+_SEP = "─" * 30
+
+# Upper bound on tool calls from one turn that are executed concurrently
+MAX_TOOL_CALL_WORKERS = 8
+
+# HTTP connection pool for the OpenAI client, sized for concurrent turns and tool calls
+OPENAI_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=100)
+
+# Opt-in cache of first-turn replies, keyed by prompt and exact user input
+RESPONSE_CACHE_MAXSIZE = 1024
+RESPONSE_CACHE_TTL = 3600
+
 
 class AIValidationError(Exception):
     """Raised when AI response fails required field validation."""
     pass
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ConversationMessage:
     role: str  # 'system', 'user', 'assistant'
     content: str
@@ -36,8 +59,11 @@ class AgentsAPIService:
         self.line_service = line_service
         self.db = database_service
 
-        # OpenAI 官方 SDK
-        self.client = OpenAI(api_key=self.config.api_key)
+        # OpenAI 官方 SDK（DefaultHttpxClient 保留 SDK 預設逾時設定，只放大連線池）
+        self.client = OpenAI(
+            api_key=self.config.api_key,
+            http_client=DefaultHttpxClient(limits=OPENAI_HTTP_LIMITS)
+        )
 
         self.prompt_id = self.config.prompt_id
         self.prompt_version = self.config.prompt_version
@@ -45,84 +71,127 @@ class AgentsAPIService:
         if not self.prompt_id:
             raise ValueError("OPENAI_PROMPT_ID must be set")
 
-        # Initialize tool functions (needs to be instance for small AI calls)
-        from src.services.tool_functions import ToolFunctions
-        self.tool_functions = ToolFunctions()
+        # 準備 prompt 參數（動態決定是否包含 version），之後每輪共用
+        self._prompt_params = {"id": self.prompt_id}
+        if self.prompt_version:
+            self._prompt_params["version"] = self.prompt_version
+            logger.debug("Using prompt version: %s", self.prompt_version)
+        else:
+            logger.debug("Using latest prompt version (auto-update)")
+
+        # Initialize tool functions (needs to be instance for small AI calls);
+        # they share this client and its connection pool
+        self.tool_functions = ToolFunctions(client=self.client)
+
+        # Map function names to actual functions
+        self._function_map = {
+            "get_current_time": ToolFunctions.get_current_time,  # Static method
+            "ask_knowledge_expert": self.tool_functions.ask_knowledge_expert,  # Instance method (needs OpenAI client)
+            "check_submission_status": self.tool_functions.check_submission_status,  # Instance method (needs OpenAI client)
+        }
+
+        # Tool calls are independent network-bound calls, so one turn's calls run concurrently
+        self._tool_pool = ThreadPoolExecutor(
+            max_workers=MAX_TOOL_CALL_WORKERS, thread_name_prefix="tool-call"
+        )
+        # Debug pushes (and their ordering sleeps) run off the request thread;
+        # a single worker keeps them in call order
+        self._debug_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-push")
+
+        # 相同問題的首輪回覆快取（OPENAI_ENABLE_RESPONSE_CACHE）
+        self._response_cache = (
+            TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL)
+            if self.config.enable_response_cache else None
+        )
+        self._response_cache_lock = threading.Lock()
 
     def get_response(self, user_id: str, user_input: str) -> AIResponse:
         """
         使用 OpenAI Prompt API 執行單輪對話。
         """
         try:
-            input_text = user_input
-
             # 取得用戶上一輪回應ID
             last_response_id = self.db.get_user_thread_id(user_id)
 
-            # 準備 prompt 參數（動態決定是否包含 version）
-            prompt_params = {"id": self.prompt_id}
-            if self.prompt_version:
-                prompt_params["version"] = self.prompt_version
-                logger.debug(f"Using prompt version: {self.prompt_version}")
-            else:
-                logger.debug("Using latest prompt version (auto-update)")
-
-            # 準備API呼叫參數
-            kwargs = {
-                "prompt": prompt_params,
-                "input": input_text,
-                "truncation": "auto"  # Auto-truncate from beginning if context exceeds limit
-            }
-
-            # 如果有上一輪對話，加入previous_response_id
-            if last_response_id:
-                kwargs["previous_response_id"] = last_response_id
-
-            # 呼叫 Responses API
-            response = self.client.responses.create(**kwargs)
-
-            # 儲存此次回應ID供下次對話使用
-            self.db.set_user_thread_id(user_id, response.id)
-
-            # CHECK FOR FUNCTION CALLS
-            function_calls = self._extract_function_calls(response)
-
-            if function_calls:
-                logger.info(f"Detected {len(function_calls)} function call(s)")
-                # Handle function calls and get final response
-                response = self._handle_function_calls(user_id, response, function_calls)
-                # Update response ID after function calls
-                self.db.set_user_thread_id(user_id, response.id)
-
-            # 取得回覆文字
-            if hasattr(response, 'output_text'):
-                response_text = response.output_text
-            elif hasattr(response, 'content'):
-                response_text = response.content
+            # 新對話的首輪可直接沿用相同問題的快取回覆
+            cache_key = None
+            cached = None
+            if self._response_cache is not None and not last_response_id:
+                cache_key = (self.prompt_id, self.prompt_version, user_input)
+                with self._response_cache_lock:
+                    cached = self._response_cache.get(cache_key)
+
+            if cached:
+                response_id, response_text = cached
+                logger.info("Response cache hit for user %s", user_id)
+                used_tools = False
             else:
-                response_text = str(response)
+                response_id, response_text, used_tools = self._create_response(
+                    user_id, user_input, last_response_id
+                )
 
             # 解析 JSON 回覆
-            parsed = self._parse_json_response(response_text, user_id)
-
-            # 落庫
-            message_history_id = self.db.log_message(
-                user_id=user_id,
-                content=user_input,
-                ai_response=parsed.text,
-                ai_explanation=parsed.explanation,
-                confidence=parsed.confidence,
-            )
-            if message_history_id:
-                self.db.save_ai_detail(message_history_id, parsed)
+            try:
+                parsed = self._parse_json_response(response_text, user_id)
+            except AIValidationError:
+                # 格式錯誤仍保留此次回應ID，後續對話從同一上下文接續
+                self.db.set_user_thread_id(user_id, response_id)
+                raise
+
+            # 只快取成功解析且未呼叫工具的回覆（工具結果可能隨時間改變）
+            if cache_key is not None and not cached and not used_tools:
+                with self._response_cache_lock:
+                    self._response_cache[cache_key] = (response_id, response_text)
+
+            # 落庫：回應ID、訊息紀錄與 AI 詳細資料同一交易寫入
+            self.db.finalize_turn(user_id, response_id, user_input, parsed)
 
             return parsed
 
         except Exception as e:
-            logger.error(f"Error in get_response: {e}")
+            logger.error("Error in get_response: %s", e)
             # Re-raise all API errors so message processor can handle them as ai_error
             raise e
 
+    def _create_response(self, user_id: str, user_input: str,
+                         last_response_id: Optional[str]) -> Tuple[str, str, bool]:
+        """
+        Call the Responses API for one turn, running any function calls.
+
+        Returns:
+            (final response ID, response text, whether function calls were made)
+        """
+        # 準備API呼叫參數
+        kwargs = {
+            "prompt": self._prompt_params,
+            "input": user_input,
+            "truncation": "auto"  # Auto-truncate from beginning if context exceeds limit
+        }
+
+        # 如果有上一輪對話，加入previous_response_id
+        if last_response_id:
+            kwargs["previous_response_id"] = last_response_id
+
+        # 呼叫 Responses API
+        response = self.client.responses.create(**kwargs)
+
+        # CHECK FOR FUNCTION CALLS
+        function_calls = self._extract_function_calls(response)
+
+        if function_calls:
+            logger.info("Detected %d function call(s)", len(function_calls))
+            # Handle function calls and get final response
+            response = self._handle_function_calls(user_id, response, function_calls)
+
+        # 取得回覆文字
+        response_text = getattr(response, 'output_text', None)
+        if response_text is None:
+            response_text = getattr(response, 'content', None)
+        if response_text is None:
+            response_text = str(response)
+
+        return response.id, response_text, bool(function_calls)
+
     # ===== 輔助 =====
     def _parse_json_response(self, response_text: str, user_id: str) -> AIResponse:
         """Parse JSON response from the agent."""
@@ -130,16 +199,23 @@ class AgentsAPIService:
             # 清理回覆文字，移除可能的前後文字或Markdown
             response_text = response_text.strip()
 
-            # 尋找 JSON 部分
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}')
+            # 快速路徑：回覆本身就是 JSON 物件時直接解析，不必再掃描大括號
+            parsed_json = None
+            if response_text.startswith('{'):
+                try:
+                    parsed_json = jiter.from_json(response_text.encode())
+                except ValueError:
+                    pass
+
+            if parsed_json is None:
+                # 尋找 JSON 部分：從第一個 '{' 解析一個完整物件，忽略其後文字
+                start_idx = response_text.find('{')
 
-            if start_idx == -1 or end_idx == -1:
-                logger.error(f"No JSON found in response: {response_text[:200]}")
-                raise AIValidationError("No JSON found in AI response")
+                if start_idx == -1:
+                    logger.error("No JSON found in response: %.200s", response_text)
+                    raise AIValidationError("No JSON found in AI response")
 
-            json_str = response_text[start_idx:end_idx + 1]
-            parsed_json = json.loads(json_str)
+                parsed_json, _ = _JSON_DECODER.raw_decode(response_text, start_idx)
 
             # STEP 1: Validate required fields exist
             # Note: 'text' can be empty (intentional silence), but must exist
@@ -151,7 +227,7 @@ class AgentsAPIService:
 
             if missing_fields:
                 error_msg = f"Missing required fields: {missing_fields}"
-                logger.error(f"AI validation failed: {error_msg}, response: {response_text[:500]}")
+                logger.error("AI validation failed: %s, response: %.500s", error_msg, response_text)
                 raise AIValidationError(error_msg)
 
             # STEP 2: Validate explanation is non-empty
@@ -167,30 +243,16 @@ class AgentsAPIService:
                 raise AIValidationError(f"Invalid confidence value: {parsed_json['confidence']}")
 
             # STEP 4: Create AIResponse with validated required fields and optional fields
-            return AIResponse(
-                text=parsed_json['text'],
-                confidence=confidence,
-                explanation=parsed_json['explanation'],
-                user_id=user_id,
-                intent=parsed_json.get("intent"),
-                queries=parsed_json.get("queries", []),
-                sources=parsed_json.get("sources", []),
-                gaps=parsed_json.get("gaps", []),
-                policy_scope=parsed_json.get("policy", {}).get("scope"),
-                policy_risk=parsed_json.get("policy", {}).get("risk"),
-                policy_pii=parsed_json.get("policy", {}).get("pii"),
-                policy_escalation=parsed_json.get("policy", {}).get("escalation"),
-                notes=parsed_json.get("notes")
-            )
+            return AIResponse.from_dict(parsed_json, user_id)
 
         except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}, response: {response_text[:500]}")
+            logger.error("JSON parsing error: %s, response: %.500s", e, response_text)
             raise AIValidationError(f"Invalid JSON in AI response: {e}")
         except AIValidationError:
             # Re-raise validation errors
             raise
         except Exception as e:
-            logger.error(f"Unexpected error parsing response: {e}")
+            logger.error("Unexpected error parsing response: %s", e)
             raise AIValidationError(f"Failed to parse AI response: {e}")
     
     def _extract_function_calls(self, response) -> list:
@@ -206,20 +268,21 @@ class AgentsAPIService:
         function_calls = []
 
         try:
-            if not hasattr(response, 'output') or not response.output:
+            output = getattr(response, 'output', None)
+            if not output:
                 return function_calls
 
-            for output_item in response.output:
-                if hasattr(output_item, 'type') and output_item.type == "function_call":
+            for output_item in output:
+                if getattr(output_item, 'type', None) == "function_call":
                     function_calls.append({
                         "name": output_item.name,
                         "arguments": output_item.arguments,
                         "call_id": output_item.call_id
                     })
-                    logger.info(f"Found function call: {output_item.name} with args: {output_item.arguments}")
+                    logger.info("Found function call: %s with args: %s", output_item.name, output_item.arguments)
 
         except Exception as e:
-            logger.error(f"Error extracting function calls: {e}")
+            logger.error("Error extracting function calls: %s", e)
 
         return function_calls
 
@@ -236,28 +299,37 @@ class AgentsAPIService:
             Final response from OpenAI after function execution
         """
         try:
-            # Execute each function and collect results
+            # Execute the functions concurrently, then collect results in call order
             function_results = []
 
             for func_call in function_calls:
+                logger.info("Executing function: %s", func_call["name"])
+                logger.info("Arguments: %s", func_call["arguments"])
+
+            if len(function_calls) == 1:
+                func_call = function_calls[0]
+                outcomes = [self._execute_function(func_call["name"], func_call["arguments"])]
+            else:
+                futures = [
+                    self._tool_pool.submit(self._execute_function, fc["name"], fc["arguments"])
+                    for fc in function_calls
+                ]
+                # _execute_function never raises; failures come back as error strings
+                outcomes = [future.result() for future in futures]
+
+            for func_call, (arguments, result) in zip(function_calls, outcomes):
                 function_name = func_call["name"]
-                arguments_str = func_call["arguments"]
                 call_id = func_call["call_id"]
 
-                logger.info(f"Executing function: {function_name}")
-                logger.info(f"Arguments: {arguments_str}")
-
-                # Execute the function
-                result = self._execute_function(function_name, arguments_str)
-
-                logger.info(f"Function result: {result}")
+                logger.info("Function result: %s", result)
 
                 # If debug mode is enabled, push small AI output to user
-                if config.show_ai_debug_info:
+                # (reusing the arguments parsed for execution)
+                if config.show_ai_debug_info and arguments is not None:
                     if function_name == "ask_knowledge_expert":
-                        self._push_small_ai_debug_info(user_id, arguments_str, result)
+                        self._debug_pool.submit(self._push_small_ai_debug_info, user_id, arguments, result)
                     elif function_name == "check_submission_status":
-                        self._push_submission_ai_debug_info(user_id, arguments_str, result)
+                        self._debug_pool.submit(self._push_submission_ai_debug_info, user_id, arguments, result)
 
                 # Prepare result for OpenAI
                 function_results.append({
@@ -270,10 +342,7 @@ class AgentsAPIService:
             logger.info("Sending function results back to OpenAI...")
 
             final_response = self.client.responses.create(
-                prompt={
-                    "id": self.prompt_id,
-                    "version": self.prompt_version
-                },
+                prompt=self._prompt_params,
                 input=function_results,
                 previous_response_id=initial_response.id,
                 truncation="auto"  # Auto-truncate from beginning if context exceeds limit
@@ -284,10 +353,10 @@ class AgentsAPIService:
             return final_response
 
         except Exception as e:
-            logger.error(f"Error handling function calls: {e}")
+            logger.error("Error handling function calls: %s", e)
             raise e
 
-    def _execute_function(self, function_name: str, arguments_str: str) -> str:
+    def _execute_function(self, function_name: str, arguments_str: str) -> Tuple[Optional[dict], str]:
         """
         Execute a function by name with given arguments.
 
@@ -296,51 +365,41 @@ class AgentsAPIService:
             arguments_str: JSON string of arguments
 
         Returns:
-            Function result as string
+            Tuple of (parsed arguments, or None if they were not valid JSON;
+            function result as string)
         """
+        # Parse arguments
         try:
-            # Import tool functions
-            from src.services.tool_functions import ToolFunctions
-            import json
-
-            # Parse arguments
-            arguments = json.loads(arguments_str)
-
-            # Map function names to actual functions
-            function_map = {
-                "get_current_time": ToolFunctions.get_current_time,  # Static method
-                "ask_knowledge_expert": self.tool_functions.ask_knowledge_expert,  # Instance method (needs OpenAI client)
-                "check_submission_status": self.tool_functions.check_submission_status,  # Instance method (needs OpenAI client)
-            }
+            arguments = jiter.from_json(arguments_str.encode())
+        except ValueError as e:
+            error_msg = f"Failed to parse function arguments: {e}"
+            logger.error(error_msg)
+            return None, error_msg
 
-            if function_name not in function_map:
+        try:
+            func = self._function_map.get(function_name)
+            if func is None:
                 error_msg = f"Unknown function: {function_name}"
                 logger.error(error_msg)
-                return error_msg
+                return arguments, error_msg
 
             # Execute the function
-            func = function_map[function_name]
             result = func(**arguments)
 
-            return result
-
-        except json.JSONDecodeError as e:
-            error_msg = f"Failed to parse function arguments: {e}"
-            logger.error(error_msg)
-            return error_msg
+            return arguments, result
 
         except Exception as e:
             error_msg = f"Error executing function {function_name}: {e}"
             logger.error(error_msg)
-            return error_msg
+            return arguments, error_msg
 
-    def _push_small_ai_debug_info(self, user_id: str, arguments_str: str, result: str) -> None:
+    def _push_small_ai_debug_info(self, user_id: str, arguments: dict, result: str) -> None:
         """
         Push small AI debug information to LINE user when debug mode is enabled.
 
         Args:
             user_id: LINE user ID
-            arguments_str: JSON string of function arguments
+            arguments: Parsed function arguments
             result: Function result (small AI response)
         """
         try:
@@ -349,10 +408,7 @@ class AgentsAPIService:
                 logger.warning("LineService not available, skipping small AI debug info push")
                 return
 
-            import time
-
-            # Parse arguments to get question
-            arguments = json.loads(arguments_str)
+            # Get question from arguments
             question = arguments.get("question", "")
             context = arguments.get("context", "")
 
@@ -368,35 +424,31 @@ class AgentsAPIService:
                 sources = []
 
             # Build debug message
-            debug_msg = "🤖 小 AI (知識專家) 回覆：\n"
-            debug_msg += "─" * 30 + "\n"
-            debug_msg += f"📝 問題：{question}\n"
+            debug_lines = ["🤖 小 AI (知識專家) 回覆：", _SEP, f"📝 問題：{question}"]
             if context:
-                debug_msg += f"📌 背景：{context}\n"
-            debug_msg += "\n💡 小 AI 答案：\n"
-            debug_msg += f"{answer}\n"
-            debug_msg += "\n" + "─" * 30 + "\n"
-            debug_msg += f"🎯 信心度：{confidence}\n"
+                debug_lines.append(f"📌 背景：{context}")
+            debug_lines += ["", "💡 小 AI 答案：", str(answer), "", _SEP, f"🎯 信心度：{confidence}"]
             if sources:
-                debug_msg += f"📚 來源：{', '.join(sources)}\n"
+                debug_lines.append(f"📚 來源：{', '.join(sources)}")
+            debug_msg = "\n".join(debug_lines) + "\n"
 
             # Push message
             time.sleep(0.3)  # Small delay to ensure proper message order
             self.line_service.push_message(user_id, debug_msg)
 
-            logger.info(f"Pushed small AI debug info to user {user_id}")
+            logger.info("Pushed small AI debug info to user %s", user_id)
 
         except Exception as e:
-            logger.error(f"Failed to push small AI debug info: {e}")
+            logger.error("Failed to push small AI debug info: %s", e)
             # Don't raise - debug info failure shouldn't break the main flow
 
-    def _push_submission_ai_debug_info(self, user_id: str, arguments_str: str, result: str) -> None:
+    def _push_submission_ai_debug_info(self, user_id: str, arguments: dict, result: str) -> None:
         """
         Push Submission AI debug information to LINE user when debug mode is enabled.
 
         Args:
             user_id: LINE user ID
-            arguments_str: JSON string of function arguments
+            arguments: Parsed function arguments
             result: Function result (Submission AI response)
         """
         try:
@@ -405,28 +457,23 @@ class AgentsAPIService:
                 logger.warning("LineService not available, skipping Submission AI debug info push")
                 return
 
-            import time
-
-            # Parse arguments to get query
-            arguments = json.loads(arguments_str)
+            # Get query from arguments
             query = arguments.get("query", "")
 
             # Build debug message
-            debug_msg = "🔍 Submission AI 回覆：\n"
-            debug_msg += "─" * 30 + "\n"
-            debug_msg += f"📝 查詢：{query}\n"
-            debug_msg += "\n💬 Submission AI 回答：\n"
-            debug_msg += f"{result}\n"
-            debug_msg += "─" * 30
+            debug_msg = "\n".join([
+                "🔍 Submission AI 回覆：", _SEP, f"📝 查詢：{query}",
+                "", "💬 Submission AI 回答：", str(result), _SEP
+            ])
 
             # Push message
             time.sleep(0.3)  # Small delay to ensure proper message order
             self.line_service.push_message(user_id, debug_msg)
 
-            logger.info(f"Pushed Submission AI debug info to user {user_id}")
+            logger.info("Pushed Submission AI debug info to user %s", user_id)
 
         except Exception as e:
-            logger.error(f"Failed to push Submission AI debug info: {e}")
+            logger.error("Failed to push Submission AI debug info: %s", e)
             # Don't raise - debug info failure shouldn't break the main flow
 
 
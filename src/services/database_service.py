@@ -1,7 +1,12 @@
 """
 Database service for managing database connections and operations.
 """
+import json
+import queue
+import threading
 import pymysql
+from cachetools import TTLCache
+from pymysql.constants import CLIENT
 from typing import Optional, Dict, Any
 from contextlib import contextmanager
 
@@ -12,29 +17,148 @@ from src.models import User
 
 logger = setup_logger(__name__)
 
+THREAD_ID_CACHE_MAXSIZE = 10_000
+
+# Statements shared by the single-purpose writers and finalize_turn
+_UPSERT_THREAD_SQL = """
+    INSERT INTO user_threads (user_id, thread_id) 
+    VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE 
+    thread_id = VALUES(thread_id),
+    updated_at = CURRENT_TIMESTAMP
+"""
+
+_INSERT_MESSAGE_SQL = """
+    INSERT INTO message_history 
+    (user_id, content, message_type, ai_response, ai_explanation, confidence) 
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+_INSERT_AI_DETAIL_SQL = """
+    INSERT INTO ai_detail 
+    (message_history_id, intent, queries, sources, gaps, 
+     policy_scope, policy_risk, policy_pii, policy_escalation, notes) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def _ai_detail_params(message_history_id: int, ai_response) -> Optional[tuple]:
+    """Build the ai_detail row for a response, or None if it has no extended data."""
+    if not (ai_response.intent or ai_response.queries or ai_response.sources or ai_response.gaps
+            or ai_response.policy_escalation or ai_response.policy_scope or ai_response.policy_risk
+            or ai_response.policy_pii or ai_response.notes):
+        return None
+    return (
+        message_history_id,
+        ai_response.intent,
+        json.dumps(ai_response.queries) if ai_response.queries else None,
+        json.dumps(ai_response.sources) if ai_response.sources else None,
+        json.dumps(ai_response.gaps) if ai_response.gaps else None,
+        ai_response.policy_scope,
+        ai_response.policy_risk,
+        ai_response.policy_pii,
+        ai_response.policy_escalation,
+        ai_response.notes
+    )
+
+
+class _ConnectionPool:
+    """Bounded pool of idle pymysql connections.
+
+    Checkout never blocks: when no idle connection is available a new one is
+    opened, and connections returned to a full pool are closed.
+    """
+
+    def __init__(self, connection_params: Dict[str, Any], size: int):
+        self._connection_params = connection_params
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        """Take an idle connection (reconnecting if stale) or open a new one."""
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            return pymysql.connect(**self._connection_params)
+
+        connection.ping(reconnect=True)
+        return connection
+
+    def release(self, connection) -> None:
+        """Return a connection to the pool, closing it if unusable or surplus."""
+        try:
+            # End any open transaction so the next user starts from a fresh snapshot
+            connection.rollback()
+            self._idle.put_nowait(connection)
+        except (pymysql.Error, queue.Full):
+            connection.close()
+
 
 class DatabaseService:
     """Service for database operations."""
     
     def __init__(self):
         self.config = config.database
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        # Optional user_id -> active thread ID cache (None means no active thread)
+        self._thread_id_cache = None
+        if self.config.thread_id_cache_ttl > 0:
+            self._thread_id_cache = TTLCache(
+                maxsize=THREAD_ID_CACHE_MAXSIZE, ttl=self.config.thread_id_cache_ttl
+            )
+        self._thread_id_cache_lock = threading.Lock()  # TTLCache is not thread-safe
+
+    def _connection_params(self) -> Dict[str, Any]:
+        """Build pymysql connection parameters from config."""
+        connection_params = {
+            'host': self.config.host,
+            'user': self.config.user,
+            'database': self.config.database,
+            'charset': self.config.charset
+        }
+
+        if self.config.password:
+            connection_params['password'] = self.config.password
+
+        return connection_params
+
+    def _get_pool(self) -> _ConnectionPool:
+        """Create the connection pool on first use."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = _ConnectionPool(self._connection_params(), self.config.pool_size)
+        return self._pool
         
     @contextmanager
     def get_connection(self):
-        """Get database connection with automatic cleanup."""
+        """Get a pooled database connection, returned to the pool on exit."""
+        pool = None
         connection = None
         try:
-            connection_params = {
-                'host': self.config.host,
-                'user': self.config.user,
-                'database': self.config.database,
-                'charset': self.config.charset
-            }
-            
-            if self.config.password:
-                connection_params['password'] = self.config.password
-                
-            connection = pymysql.connect(**connection_params)
+            pool = self._get_pool()
+            connection = pool.acquire()
+            yield connection
+        except pymysql.Error as e:
+            logger.error(f"Database connection error: {e}")
+            raise DatabaseError(f"Failed to connect to database: {e}")
+        finally:
+            if connection:
+                pool.release(connection)
+
+    @contextmanager
+    def _get_schema_connection(self):
+        """
+        Get a dedicated, non-pooled connection that accepts multi-statement batches.
+
+        Only used for schema setup so pooled connections never run stacked statements.
+        """
+        connection = None
+        try:
+            connection = pymysql.connect(
+                **self._connection_params(), client_flag=CLIENT.MULTI_STATEMENTS
+            )
             yield connection
         except pymysql.Error as e:
             logger.error(f"Database connection error: {e}")
@@ -42,6 +166,13 @@ class DatabaseService:
         finally:
             if connection:
                 connection.close()
+
+    @staticmethod
+    def _execute_batch(cursor, statements) -> None:
+        """Send several statements in one round-trip and drain every result."""
+        cursor.execute(";\n".join(sql.strip().rstrip(';') for sql in statements))
+        while cursor.nextset():
+            pass
     
     def execute_query(self, query: str, params: tuple = None, fetch_one: bool = False, fetch_all: bool = False):
         """
@@ -76,7 +207,7 @@ class DatabaseService:
     def initialize_tables(self):
         """Initialize required database tables."""
         try:
-            with self.get_connection() as conn:
+            with self._get_schema_connection() as conn:
                 cursor = conn.cursor()
                 
                 # User threads table
@@ -133,11 +264,6 @@ class DatabaseService:
                     INDEX idx_expires_at (expires_at)
                 );
                 """
-                
-                cursor.execute(create_user_threads_sql)
-                cursor.execute(create_messages_sql)
-                cursor.execute(create_organization_sql)
-                cursor.execute(create_handover_sql)
 
                 # Sync tracking table
                 create_sync_tracking_sql = """
@@ -150,24 +276,42 @@ class DatabaseService:
                     INDEX idx_last_sync_time (last_sync_time)
                 );
                 """
-                cursor.execute(create_sync_tracking_sql)
+
+                self._execute_batch(cursor, [
+                    create_user_threads_sql,
+                    create_messages_sql,
+                    create_organization_sql,
+                    create_handover_sql,
+                    create_sync_tracking_sql
+                ])
+
+                # Probe every column/index the migrations below depend on in one round-trip
+                cursor.execute("""
+                    SELECT 'column', TABLE_NAME, COLUMN_NAME
+                    FROM information_schema.COLUMNS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                      AND TABLE_NAME IN ('message_history', 'organization_data', 'ai_detail')
+                    UNION ALL
+                    SELECT DISTINCT 'index', TABLE_NAME, INDEX_NAME
+                    FROM information_schema.STATISTICS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                      AND TABLE_NAME = 'organization_data'
+                      AND INDEX_NAME = 'idx_updated_at'
+                """)
+                schema = {tuple(row) for row in cursor.fetchall()}
                 
+                # Upgrades for existing installations, sent together once decided
+                pending_ddl = []
+
                 # Add explanation column if it doesn't exist (for existing installations)
-                cursor.execute("SHOW COLUMNS FROM message_history LIKE 'ai_explanation'")
-                column_exists = cursor.fetchone()
-                
-                if not column_exists:
+                if ('column', 'message_history', 'ai_explanation') not in schema:
                     logger.info("Adding ai_explanation column to message_history table...")
-                    cursor.execute("ALTER TABLE message_history ADD COLUMN ai_explanation TEXT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-                    logger.info("ai_explanation column added successfully")
+                    pending_ddl.append("ALTER TABLE message_history ADD COLUMN ai_explanation TEXT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
                 else:
                     logger.info("ai_explanation column already exists")
                 
                 # Create ai_detail table if it doesn't exist (for existing installations)
-                cursor.execute("SHOW TABLES LIKE 'ai_detail'")
-                table_exists = cursor.fetchone()
-                
-                if not table_exists:
+                if not any(table == 'ai_detail' for _, table, _ in schema):
                     logger.info("Creating ai_detail table...")
                     create_ai_detail_sql = """
                         CREATE TABLE ai_detail (
@@ -189,14 +333,19 @@ class DatabaseService:
                             FOREIGN KEY (message_history_id) REFERENCES message_history(id) ON DELETE CASCADE
                         )
                     """
-                    cursor.execute(create_ai_detail_sql)
-                    logger.info("ai_detail table created successfully")
+                    pending_ddl.append(create_ai_detail_sql)
                 else:
                     logger.info("ai_detail table already exists")
+
+                if pending_ddl:
+                    self._execute_batch(cursor, pending_ddl)
+                    logger.info(f"Applied {len(pending_ddl)} schema upgrade(s) to message_history/ai_detail")
                 
                 # Migrate existing organization_data table to new simplified schema
-                cursor.execute("SHOW COLUMNS FROM organization_data")
-                existing_columns = [col[0] for col in cursor.fetchall()]
+                existing_columns = [
+                    name for kind, table, name in schema
+                    if kind == 'column' and table == 'organization_data'
+                ]
 
                 # Check if we need to migrate from old schema - check for ANY old column
                 old_columns = ['username', 'service_city', 'contact_info', 'service_target', 'completion_status', 'raw_messages', 'handover_flag_expires_at']
@@ -243,10 +392,7 @@ class DatabaseService:
                     logger.info("Organization data table already uses simplified schema")
 
                 # Add missing index on updated_at if it doesn't exist
-                cursor.execute("SHOW INDEXES FROM organization_data WHERE Key_name = 'idx_updated_at'")
-                updated_at_index_exists = cursor.fetchone() is not None
-
-                if not updated_at_index_exists:
+                if ('index', 'organization_data', 'idx_updated_at') not in schema:
                     logger.info("Adding missing idx_updated_at index...")
                     cursor.execute("ALTER TABLE organization_data ADD INDEX idx_updated_at (updated_at)")
                     logger.info("idx_updated_at index added successfully")
@@ -269,8 +415,25 @@ class DatabaseService:
             logger.error(f"Failed to initialize tables: {e}")
             raise DatabaseError(f"Table initialization failed: {e}")
     
+    def _remember_thread_id(self, user_id: str, thread_id: Optional[str]) -> None:
+        """Record a stored thread ID in the cache, if caching is enabled."""
+        if self._thread_id_cache is None:
+            return
+
+        with self._thread_id_cache_lock:
+            if thread_id is None or self._thread_id_cache.get(user_id):
+                self._thread_id_cache[user_id] = thread_id
+            else:
+                # The upsert leaves is_active untouched, so an unknown or inactive row is re-read
+                self._thread_id_cache.pop(user_id, None)
+
     def get_user_thread_id(self, user_id: str) -> Optional[str]:
         """Get thread ID for a user."""
+        if self._thread_id_cache is not None:
+            with self._thread_id_cache_lock:
+                if user_id in self._thread_id_cache:
+                    return self._thread_id_cache[user_id]
+
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -279,29 +442,30 @@ class DatabaseService:
                     (user_id,)
                 )
                 result = cursor.fetchone()
-                return result[0] if result else None
+                thread_id = result[0] if result else None
                 
         except Exception as e:
             logger.error(f"Failed to get thread ID for user {user_id}: {e}")
             raise DatabaseError(f"Failed to retrieve thread ID: {e}")
+
+        if self._thread_id_cache is not None:
+            with self._thread_id_cache_lock:
+                self._thread_id_cache[user_id] = thread_id
+        return thread_id
     
     def set_user_thread_id(self, user_id: str, thread_id: str) -> None:
         """Set thread ID for a user."""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO user_threads (user_id, thread_id) 
-                    VALUES (%s, %s)
-                    ON DUPLICATE KEY UPDATE 
-                    thread_id = VALUES(thread_id),
-                    updated_at = CURRENT_TIMESTAMP
-                """, (user_id, thread_id))
+                cursor.execute(_UPSERT_THREAD_SQL, (user_id, thread_id))
                 conn.commit()
                 
         except Exception as e:
             logger.error(f"Failed to set thread ID for user {user_id}: {e}")
             raise DatabaseError(f"Failed to set thread ID: {e}")
+
+        self._remember_thread_id(user_id, thread_id)
     
     def reset_user_thread(self, user_id: str) -> None:
         """Reset user's thread by marking as inactive."""
@@ -317,6 +481,8 @@ class DatabaseService:
         except Exception as e:
             logger.error(f"Failed to reset thread for user {user_id}: {e}")
             raise DatabaseError(f"Failed to reset thread: {e}")
+
+        self._remember_thread_id(user_id, None)
     
     def log_message(self, user_id: str, content: str, message_type: str = "text", 
                    ai_response: str = None, ai_explanation: str = None, confidence: float = None) -> int:
@@ -324,11 +490,10 @@ class DatabaseService:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO message_history 
-                    (user_id, content, message_type, ai_response, ai_explanation, confidence) 
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (user_id, content, message_type, ai_response, ai_explanation, confidence))
+                cursor.execute(
+                    _INSERT_MESSAGE_SQL,
+                    (user_id, content, message_type, ai_response, ai_explanation, confidence)
+                )
                 conn.commit()
                 return cursor.lastrowid  # Return message_history ID for linking
                 
@@ -367,29 +532,11 @@ class DatabaseService:
                 logger.info(f"[AI_DETAIL] No extended data to save, skipping")
                 return
             
-            import json
-            
             logger.info(f"[AI_DETAIL] Proceeding to save data to database")
             
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO ai_detail 
-                    (message_history_id, intent, queries, sources, gaps, 
-                     policy_scope, policy_risk, policy_pii, policy_escalation, notes) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    message_history_id,
-                    ai_response.intent,
-                    json.dumps(ai_response.queries) if ai_response.queries else None,
-                    json.dumps(ai_response.sources) if ai_response.sources else None,
-                    json.dumps(ai_response.gaps) if ai_response.gaps else None,
-                    ai_response.policy_scope,
-                    ai_response.policy_risk,
-                    ai_response.policy_pii,
-                    ai_response.policy_escalation,
-                    ai_response.notes
-                ))
+                cursor.execute(_INSERT_AI_DETAIL_SQL, _ai_detail_params(message_history_id, ai_response))
                 conn.commit()
                 logger.info(f"[AI_DETAIL] Successfully saved AI detail for message_history_id: {message_history_id}")
                 
@@ -398,6 +545,46 @@ class DatabaseService:
             # Don't raise exception for logging failures to avoid disrupting main flow
             pass
     
+    def finalize_turn(self, user_id: str, thread_id: str, content: str, ai_response) -> Optional[int]:
+        """
+        Persist a completed AI turn in one transaction: store the user's new
+        thread ID, log the message and save its AI detail row.
+
+        Message/detail logging failures are logged and swallowed like
+        log_message/save_ai_detail; a thread ID failure raises DatabaseError.
+
+        Returns:
+            The message_history ID, or None if logging the message failed
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(_UPSERT_THREAD_SQL, (user_id, thread_id))
+
+                message_history_id = None
+                try:
+                    cursor.execute(_INSERT_MESSAGE_SQL, (
+                        user_id, content, "text", ai_response.text,
+                        ai_response.explanation, ai_response.confidence
+                    ))
+                    message_history_id = cursor.lastrowid
+
+                    detail_params = _ai_detail_params(message_history_id, ai_response)
+                    if detail_params:
+                        cursor.execute(_INSERT_AI_DETAIL_SQL, detail_params)
+                except Exception as e:
+                    # A failed statement is rolled back on its own; the thread ID still commits
+                    logger.error(f"Failed to log turn for user {user_id}: {e}")
+
+                conn.commit()
+
+        except Exception as e:
+            logger.error(f"Failed to finalize turn for user {user_id}: {e}")
+            raise DatabaseError(f"Failed to finalize turn: {e}")
+
+        self._remember_thread_id(user_id, thread_id)
+        return message_history_id
+
     def ensure_user_record(self, user_id: str) -> None:
         """Ensure a user record exists in organization_data table."""
         try:
@@ -428,8 +615,10 @@ class DatabaseService:
                         ON DUPLICATE KEY UPDATE user_id = user_id
                     """, (user_id,))
 
+                # Only the columns callers read; timestamps are left to the Sheets sync queries
                 cursor.execute("""
-                    SELECT * FROM organization_data WHERE user_id = %s
+                    SELECT user_id, organization_name, reminded_count, is_new
+                    FROM organization_data WHERE user_id = %s
                 """, (user_id,))
                 result = cursor.fetchone()
 
@@ -545,22 +734,24 @@ class DatabaseService:
             limit: Maximum number of users to return (default: 100)
 
         Returns:
-            List of dicts with user info and handover status
+            List of dicts with user info and handover status; timestamps are
+            pre-formatted 'YYYY-MM-DD HH:MM:SS' strings (None when unset)
         """
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor(pymysql.cursors.DictCursor)
+                # '%%' because pymysql applies %-formatting when params are passed
                 cursor.execute("""
                     SELECT
                         od.user_id,
                         COALESCE(od.organization_name, '(未設定)') as organization_name,
-                        od.updated_at as last_activity,
+                        DATE_FORMAT(od.updated_at, '%%Y-%%m-%%d %%H:%%i:%%s') as last_activity,
                         od.is_new,
                         CASE
                             WHEN uhf.expires_at > NOW() THEN 1
                             ELSE 0
                         END as is_blocked,
-                        uhf.expires_at as blocked_until
+                        DATE_FORMAT(uhf.expires_at, '%%Y-%%m-%%d %%H:%%i:%%s') as blocked_until
                     FROM organization_data od
                     LEFT JOIN user_handover_flags uhf ON od.user_id = uhf.user_id
                     ORDER BY od.updated_at DESC
@@ -176,7 +176,9 @@ class GoogleSheetsService:
             return True
 
         try:
-            # Convert messages to sheet format
+            # Convert messages to sheet format; every cell is built as str/int,
+            # so the rows are JSON serializable as-is
+            synced_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
             rows = []
             for msg in messages:
                 # Handle confidence field - convert Decimal to float or empty string
@@ -191,7 +193,7 @@ class GoogleSheetsService:
                     confidence = ''
 
                 row = [
-                    datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),  # Timestamp (UTC)
+                    synced_at,                                     # Timestamp (UTC)
                     str(msg.get('user_id', '')),                   # User ID
                     str(msg.get('organization_name', '')),         # Organization
                     str(msg.get('message_type', 'text')),          # Message Type
@@ -206,22 +208,8 @@ class GoogleSheetsService:
             # Append to sheet
             range_name = f"{sheet_name}!A:I"
 
-            # Ensure all values are JSON serializable (strings, numbers, booleans)
-            sanitized_rows = []
-            for row in rows:
-                sanitized_row = []
-                for value in row:
-                    if value is None:
-                        sanitized_row.append('')
-                    elif isinstance(value, (str, int, float, bool)):
-                        sanitized_row.append(value)
-                    else:
-                        # Convert any other type to string
-                        sanitized_row.append(str(value))
-                sanitized_rows.append(sanitized_row)
-
             body = {
-                'values': sanitized_rows
+                'values': rows
             }
 
             result = self.service.spreadsheets().values().append(
@@ -259,7 +247,8 @@ class GoogleSheetsService:
             return True
 
         try:
-            # Convert organizations to sheet format
+            # Convert organizations to sheet format; every cell is built as str/int,
+            # so the rows are JSON serializable as-is
             rows = []
             for org in organizations:
                 is_new_user = org.get('is_new', False)
@@ -276,22 +265,8 @@ class GoogleSheetsService:
             # Append to sheet
             range_name = f"{sheet_name}!A:F"
 
-            # Ensure all values are JSON serializable (strings, numbers, booleans)
-            sanitized_rows = []
-            for row in rows:
-                sanitized_row = []
-                for value in row:
-                    if value is None:
-                        sanitized_row.append('')
-                    elif isinstance(value, (str, int, float, bool)):
-                        sanitized_row.append(value)
-                    else:
-                        # Convert any other type to string
-                        sanitized_row.append(str(value))
-                sanitized_rows.append(sanitized_row)
-
             body = {
-                'values': sanitized_rows
+                'values': rows
             }
 
             result = self.service.spreadsheets().values().append(
@@ -2,9 +2,12 @@
 LINE messaging service for handling LINE Bot interactions.
 """
 from typing import List, Optional, TYPE_CHECKING
+import threading
 import time
 import re
 
+from cachetools import TTLCache
+
 if TYPE_CHECKING:
     from src.services.user_handover_service import UserHandoverService
 
@@ -24,6 +27,12 @@ from src.messages import messages
 
 logger = setup_logger(__name__)
 
+# LINE display name cache: entries are re-fetched after the TTL
+NICKNAME_CACHE_TTL = 600
+NICKNAME_CACHE_MAXSIZE = 10_000
+# Failed profile lookups are remembered briefly so unknown users don't hammer the API
+NICKNAME_NEGATIVE_CACHE_TTL = 60
+
 
 class LineService:
     """Service for LINE messaging operations."""
@@ -32,7 +41,9 @@ class LineService:
         self.config = config.line
         line_config = Configuration(access_token=self.config.channel_access_token)
         self.messaging_api = MessagingApi(ApiClient(line_config))
-        self._user_cache = {}  # Cache for user profiles
+        self._user_cache = TTLCache(maxsize=NICKNAME_CACHE_MAXSIZE, ttl=NICKNAME_CACHE_TTL)
+        self._failed_lookups = TTLCache(maxsize=NICKNAME_CACHE_MAXSIZE, ttl=NICKNAME_NEGATIVE_CACHE_TTL)
+        self._user_cache_lock = threading.Lock()  # TTLCache is not thread-safe
         self.db = DatabaseService()
         self.handover_service = user_handover_service
     
@@ -66,23 +77,30 @@ class LineService:
         Returns:
             User's display name or user_id if not available
         """
+        # Check cache first
+        with self._user_cache_lock:
+            display_name = self._user_cache.get(user_id)
+            if display_name is not None:
+                return display_name
+            if user_id in self._failed_lookups:
+                return user_id
+
         try:
-            # Check cache first
-            if user_id in self._user_cache:
-                return self._user_cache[user_id]
-            
             # Get profile from LINE API
             profile = self.messaging_api.get_profile(user_id)
             
             display_name = profile.display_name
             
             # Cache the result
-            self._user_cache[user_id] = display_name
+            with self._user_cache_lock:
+                self._user_cache[user_id] = display_name
             
             return display_name
             
         except Exception as e:
             logger.warning(f"Failed to get user profile for {user_id}: {e}")
+            with self._user_cache_lock:
+                self._failed_lookups[user_id] = True
             # Return user_id as fallback
             return user_id
     
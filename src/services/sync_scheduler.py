@@ -45,17 +45,14 @@ class SyncScheduler:
                 logger.info("No new messages to sync")
                 return True
 
-            # Enrich messages with user data
-            enriched_messages = self._enrich_messages_with_user_data(new_messages)
-
-            # Sync to Google Sheets
-            success = self.sheets.sync_message_history(enriched_messages)
+            # Sync to Google Sheets (rows already carry organization_name)
+            success = self.sheets.sync_message_history(new_messages)
 
             if success:
                 # Update last sync time to the latest message timestamp
                 latest_message_time = max(msg.get('created_at') for msg in new_messages)
                 self._update_last_sync_time("message_history", latest_message_time)
-                logger.info(f"Successfully synced {len(enriched_messages)} messages to Google Sheets (latest: {latest_message_time})")
+                logger.info(f"Successfully synced {len(new_messages)} messages to Google Sheets (latest: {latest_message_time})")
             else:
                 logger.error(f"Failed to sync {len(new_messages)} messages to Google Sheets")
 
@@ -164,21 +161,23 @@ class SyncScheduler:
             return datetime.now(timezone.utc) - timedelta(hours=1)
 
     def _get_new_messages_since(self, since_time: datetime) -> List[Dict[str, Any]]:
-        """Get new message history records since the given time."""
+        """Get new message history records since the given time, joined with organization name."""
         try:
             query = """
                 SELECT
-                    id,
-                    user_id,
-                    content,
-                    message_type,
-                    ai_response,
-                    ai_explanation,
-                    confidence,
-                    created_at
-                FROM message_history
-                WHERE created_at >= %s
-                ORDER BY created_at ASC
+                    mh.id,
+                    mh.user_id,
+                    mh.content,
+                    mh.message_type,
+                    mh.ai_response,
+                    mh.ai_explanation,
+                    mh.confidence,
+                    mh.created_at,
+                    COALESCE(od.organization_name, '') AS organization_name
+                FROM message_history mh
+                LEFT JOIN organization_data od ON od.user_id = mh.user_id
+                WHERE mh.created_at >= %s
+                ORDER BY mh.created_at ASC
                 LIMIT 1000
             """
 
@@ -248,32 +247,6 @@ class SyncScheduler:
         deduplicated.sort(key=lambda x: x.get('updated_at', ''))
         return deduplicated
 
-    def _enrich_messages_with_user_data(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Enrich messages with user organization data."""
-        try:
-            enriched = []
-
-            for msg in messages:
-                user_id = msg.get('user_id')
-
-                # Get user organization data
-                org_data = self.db.get_organization_record(user_id)
-
-                # Add organization data to message
-                enriched_msg = msg.copy()
-                if org_data:
-                    enriched_msg['organization_name'] = org_data.get('organization_name', '')
-                else:
-                    enriched_msg['organization_name'] = ''
-
-                enriched.append(enriched_msg)
-
-            return enriched
-
-        except Exception as e:
-            logger.error(f"Failed to enrich messages with user data: {e}")
-            return messages
-
     def _update_last_sync_time(self, sync_type: str, new_sync_time: datetime) -> None:
         """Update the last sync time in database using the actual last record timestamp."""
         try:
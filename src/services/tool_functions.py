@@ -15,9 +15,9 @@ logger = setup_logger(__name__)
 class ToolFunctions:
     """Collection of functions that AI can call via function calling."""
 
-    def __init__(self):
-        """Initialize with OpenAI client for calling small AI."""
-        self.client = OpenAI(api_key=config.openai.api_key)
+    def __init__(self, client: Optional[OpenAI] = None):
+        """Initialize with OpenAI client for calling small AI (reuses the caller's client if given)."""
+        self.client = client or OpenAI(api_key=config.openai.api_key)
 
     @staticmethod
     def get_current_time(timezone_name: Optional[str] = "UTC") -> str:
@@ -119,11 +119,10 @@ class ToolFunctions:
             )
 
             # 取得小 AI 的回覆
-            if hasattr(response, 'output_text'):
-                result = response.output_text
-            elif hasattr(response, 'content'):
-                result = response.content
-            else:
+            result = getattr(response, 'output_text', None)
+            if result is None:
+                result = getattr(response, 'content', None)
+            if result is None:
                 result = str(response)
 
             logger.info(f"[Knowledge Expert] Response: {result[:200]}...")
@@ -193,11 +192,10 @@ class ToolFunctions:
             )
 
             # Extract response text
-            if hasattr(response, 'output_text'):
-                result = response.output_text
-            elif hasattr(response, 'content'):
-                result = response.content
-            else:
+            result = getattr(response, 'output_text', None)
+            if result is None:
+                result = getattr(response, 'content', None)
+            if result is None:
                 result = str(response)
 
             logger.info(f"[Submission AI] Response: {result[:200]}...")